@@ -0,0 +1,11 @@
+# Gunicorn settings; picked up automatically from the working directory by `gunicorn web_server:app`.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5021)}"
+# One process keeps the in-process dashboard/catalog caches coherent; threads give concurrency while requests wait on MySQL.
+# Fixed rather than read from WEB_CONCURRENCY, which Heroku-style hosts set for every app.
+# gthread rather than gevent: the mysql-connector C extension blocks in C, which gevent cannot yield around.
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+keepalive = 5
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+import mysql.connector
+from mysql.connector import pooling
+
+# web_server bootstraps the database on import, so the driver is replaced for that import only.
+os.environ.setdefault('DB_INIT_LOCK', os.path.join(tempfile.gettempdir(), 'cozy_test_init.lock'))
+pooled = mock.MagicMock()
+pooled.__class__ = pooling.PooledMySQLConnection
+with mock.patch.object(mysql.connector, 'connect'), mock.patch.object(pooling, 'MySQLConnectionPool') as pool:
+    pool.return_value.get_connection.return_value = pooled
+    from web_server import deduct_stock_statement, order_batch
+
+
+class DeductStockStatementTest(unittest.TestCase):
+    def test_nothing_to_take(self):
+        self.assertIsNone(deduct_stock_statement(4, 'seller', {}))
+
+    def test_case_update(self):
+        sql, params = deduct_stock_statement(4, 'seller', {3: 2, 5: 1})
+        self.assertEqual(sql, "UPDATE inventory SET quantity = quantity - CASE product_id WHEN %s THEN %s WHEN %s THEN %s END WHERE owner_id = %s AND owner_type = %s AND product_id IN (%s, %s)")
+        self.assertEqual(params, [3, 2, 5, 1, 4, 'seller', 3, 5])
+
+
+class OrderBatchTest(unittest.TestCase):
+    lines = [(1, 3, Decimal('45.99')), (2, 1, Decimal('10.00'))]
+
+    def test_params_line_up_with_placeholders(self):
+        sql, params = order_batch(4, 2, 'ORD-1', 'Ann', 'a@x.com', self.lines, {1: 2}, {1: 1, 2: 1})
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertEqual([statement.split(' ', 1)[0] for statement in sql.split('; ')], ['UPDATE', 'UPDATE', 'INSERT', 'SET', 'INSERT'])
+        self.assertEqual(params, [1, 2, 4, 'seller', 1,
+                                  1, 1, 2, 1, 2, 'distributor', 1, 2,
+                                  'ORD-1', 4, 2, 'Ann', 'a@x.com', Decimal('147.97'),
+                                  1, 3, Decimal('45.99'), 2, 1, Decimal('10.00')])
+
+    def test_skips_empty_deductions(self):
+        sql, params = order_batch(4, 2, 'ORD-1', 'Ann', '', self.lines[:1], {1: 3}, {})
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertEqual(sql.split('; ')[1:], [
+            "INSERT INTO orders (order_number, seller_id, distributor_id, customer_name, customer_email, total_amount) VALUES (%s, %s, %s, %s, %s, %s)",
+            "SET @order_id = LAST_INSERT_ID()",
+            "INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES (@order_id, %s, %s, %s)"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,20 +2,81 @@
 # Cozy Comfort Web Server 
 
 import os
-import traceback
-from datetime import datetime
+import re
+import gzip
+import fcntl
+import hashlib
+import secrets
+import threading
+import queue
+import atexit
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from functools import wraps
 from decimal import Decimal, InvalidOperation
 
+import orjson
+import rcssmin
+import rjsmin
+try: import brotli
+except ImportError: brotli = None
 import mysql.connector
-from flask import Flask, request, jsonify, render_template_string, session
+from mysql.connector import pooling, errorcode
+from flask import Flask, Response, request, session, g
 from flask_cors import CORS
+from flask_caching import Cache
+from flask_compress import Compress
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
 
+# Request threads only enqueue log records; a listener thread does the blocking stderr write.
+log = logging.getLogger(__name__)
+log_queue = queue.SimpleQueue()
+log.addHandler(logging.handlers.QueueHandler(log_queue))
+log.setLevel(logging.INFO)
+log.propagate = False
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+
+
 # DATABASE SETUP AND CONNECTION
 
+DB_INIT_LOCK = os.environ.get('DB_INIT_LOCK', '/tmp/cozy_init.lock')
+DB_OVERFLOW_WAIT = 2  # seconds a request waits for an overflow slot before failing
+# Bump whenever create_tables() or the sample data changes so existing databases get bootstrapped again.
+SCHEMA_VERSION = 2
+BULK_INSERT_CHUNK_SIZE = 1000  # keeps each statement well under max_allowed_packet
+
+def bulk_insert(cursor, sql_prefix, rows, chunk_size=BULK_INSERT_CHUNK_SIZE):
+    """Inserts rows with one multi-row VALUES statement per chunk instead of one INSERT per row."""
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        placeholders = "(" + ", ".join(["%s"] * len(chunk[0])) + ")"
+        cursor.execute(f"{sql_prefix} VALUES {', '.join([placeholders] * len(chunk))}", [value for row in chunk for value in row])
+
+def deduct_stock_statement(owner_id, owner_type, deductions):
+    """(sql, params) for one CASE UPDATE taking {product_id: quantity} from an owner's stock, or None if there is nothing to take."""
+    if not deductions: return None
+    cases = " ".join(["WHEN %s THEN %s"] * len(deductions))
+    placeholders = ", ".join(["%s"] * len(deductions))
+    return f"UPDATE inventory SET quantity = quantity - CASE product_id {cases} END WHERE owner_id = %s AND owner_type = %s AND product_id IN ({placeholders})", [value for item in deductions.items() for value in item] + [owner_id, owner_type, *deductions]
+
+def order_batch(seller_id, distributor_id, order_number, customer_name, customer_email, lines, seller_deductions, distributor_deductions):
+    """(sql, params) deducting the stock and inserting the order and its (product_id, quantity, unit_price) lines in one execute."""
+    batch = [statement for statement in (deduct_stock_statement(seller_id, 'seller', seller_deductions), deduct_stock_statement(distributor_id, 'distributor', distributor_deductions)) if statement]
+    total_amount = sum((unit_price * quantity for _, quantity, unit_price in lines), Decimal('0.00'))
+    batch += [("INSERT INTO orders (order_number, seller_id, distributor_id, customer_name, customer_email, total_amount) VALUES (%s, %s, %s, %s, %s, %s)", (order_number, seller_id, distributor_id, customer_name, customer_email, total_amount)),
+              ("SET @order_id = LAST_INSERT_ID()", ()),
+              ("INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES " + ", ".join(["(@order_id, %s, %s, %s)"] * len(lines)), [value for line in lines for value in line])]
+    return "; ".join(sql for sql, _ in batch), [value for _, params in batch for value in params]
+
 class DatabaseManager:
     """
     Manages the MySQL database connection, setup, and initial data population.
@@ -27,35 +88,100 @@ class DatabaseManager:
             'user': os.environ.get('MYSQL_USER'),
             'password': os.environ.get('MYSQL_PASSWORD'),
             'database': os.environ.get('MYSQL_DATABASE'),
-            'port': int(os.environ.get('MYSQL_PORT', 3306))
+            'port': int(os.environ.get('MYSQL_PORT', 3306)),
+            'use_pure': not mysql.connector.HAVE_CEXT,  # C extension protocol parser when installed
+            # MULTI_STATEMENTS lets related queries share one round trip; FOUND_ROWS makes rowcount count matched, not changed, rows.
+            'client_flags': [mysql.connector.ClientFlag.MULTI_STATEMENTS, mysql.connector.ClientFlag.FOUND_ROWS]
         }
+        if not mysql.connector.HAVE_CEXT: print("⚠️ mysql-connector C extension is unavailable; falling back to the pure-Python protocol.")
+        self.pool_size = int(os.environ.get('DB_POOL_SIZE', 10))
+        # Caps the direct connections opened while every pooled one is busy.
+        self.overflow = threading.BoundedSemaphore(int(os.environ.get('DB_POOL_OVERFLOW', 5)))
+        self.pool = None
         self.init_database()
 
+    def checkout(self):
+        """Takes a pooled connection, or a bounded direct one when every pooled connection is in use; release() returns either."""
+        try: return self.pool.get_connection()
+        except pooling.PoolError:
+            if not self.overflow.acquire(timeout=DB_OVERFLOW_WAIT):
+                log.error("Connection pool and overflow exhausted; rejecting the request.")
+                raise
+        log.warning("Connection pool exhausted; opening a direct overflow connection.")
+        try: return mysql.connector.connect(**self.config)
+        except BaseException: self.overflow.release(); raise
+
+    def release(self, conn):
+        """Closes a checked-out connection, freeing its overflow slot if it was a direct one."""
+        try: conn.close()
+        finally:
+            if not isinstance(conn, pooling.PooledMySQLConnection): self.overflow.release()
+
     def get_connection(self):
-        """Establishes and returns a database connection."""
+        """Checks out a connection for the bootstrap steps, returning None instead of raising."""
         try:
-            conn = mysql.connector.connect(**self.config)
+            conn = self.checkout()
             return conn
         except mysql.connector.Error as err:
             print(f"❌ Database connection error: {err}")
             return None
 
+    @contextmanager
+    def txn(self, dictionary=False):
+        """Yields (cursor, conn) inside one transaction: committed on exit, rolled back if the block raises."""
+        conn = self.checkout()
+        try:
+            conn.start_transaction()
+            cursor = conn.cursor(dictionary=dictionary)
+            try:
+                yield cursor, conn
+                if conn.in_transaction: conn.commit()
+            except BaseException: conn.rollback(); raise
+            finally: cursor.close()
+        finally: self.release(conn)
+
+    @contextmanager
+    def ro(self, dictionary=False):
+        """Yields (cursor, conn) for plain reads; no transaction is started and nothing is committed."""
+        conn = self.checkout()
+        try:
+            cursor = conn.cursor(dictionary=dictionary)
+            try: yield cursor, conn
+            finally: cursor.close()
+        finally: self.release(conn)
+
     def init_database(self):
         """Coordinates the entire database setup process."""
         try:
             print("--- Starting Database Initialization ---")
-            temp_config = self.config.copy()
-            db_name = temp_config.pop('database')
-            
-            conn = mysql.connector.connect(**temp_config)
-            cursor = conn.cursor()
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
-            print(f"✅ Database '{db_name}' is ready.")
-            cursor.close()
-            conn.close()
-
-            self.create_tables()
-            self.insert_sample_data()
+            with open(DB_INIT_LOCK, 'w') as lock_file:
+                # Only one gunicorn worker bootstraps the schema; the others wait for it and reuse its work.
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    bootstrap = True
+                except BlockingIOError:
+                    print("  - Another worker is initializing the database. Waiting for it...")
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    bootstrap = False
+
+                if bootstrap:
+                    temp_config = self.config.copy()
+                    db_name = temp_config.pop('database')
+
+                    conn = mysql.connector.connect(**temp_config)
+                    cursor = conn.cursor()
+                    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
+                    print(f"✅ Database '{db_name}' is ready.")
+                    cursor.close()
+                    conn.close()
+
+                # The pool can only be built once the database exists.
+                self.pool = pooling.MySQLConnectionPool(pool_name="cozy", pool_size=self.pool_size, pool_reset_session=True, **self.config)
+                print(f"✅ Connection pool ready ({self.pool_size} connections).")
+
+                if bootstrap:
+                    if self.schema_is_current(): print(f"  - Schema version {SCHEMA_VERSION} already in place. Skipping table and sample data checks.")
+                    elif self.create_tables() and self.insert_sample_data(): self.mark_schema_current()
             print("\n✅ Database setup complete and is persistent.")
             
         except mysql.connector.Error as err:
@@ -70,33 +196,61 @@ class DatabaseManager:
             exit(1)
         
         print("\nChecking and creating tables...")
-        cursor = conn.cursor()
+        cursor = conn.cursor(buffered=True)
         try:
             cursor.execute("CREATE TABLE IF NOT EXISTS users (id INT AUTO_INCREMENT PRIMARY KEY, username VARCHAR(100) UNIQUE NOT NULL, email VARCHAR(150) UNIQUE NOT NULL, password VARCHAR(255) NOT NULL, user_type ENUM('manufacturer', 'distributor', 'seller') NOT NULL, company_name VARCHAR(200), created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP) ENGINE=InnoDB;")
             cursor.execute("CREATE TABLE IF NOT EXISTS products (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(200) NOT NULL, model VARCHAR(100) NOT NULL, material VARCHAR(100), size VARCHAR(50), color VARCHAR(50), price DECIMAL(10,2) NOT NULL, manufacturer_id INT, FOREIGN KEY (manufacturer_id) REFERENCES users(id) ON DELETE SET NULL) ENGINE=InnoDB;")
             cursor.execute("CREATE TABLE IF NOT EXISTS inventory (id INT AUTO_INCREMENT PRIMARY KEY, product_id INT NOT NULL, owner_id INT NOT NULL, owner_type ENUM('manufacturer', 'distributor', 'seller') NOT NULL, quantity INT NOT NULL DEFAULT 0, FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE, FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE, UNIQUE KEY unique_inventory (product_id, owner_id, owner_type)) ENGINE=InnoDB;")
             cursor.execute("CREATE TABLE IF NOT EXISTS orders (id INT AUTO_INCREMENT PRIMARY KEY, order_number VARCHAR(100) UNIQUE NOT NULL, seller_id INT NOT NULL, distributor_id INT, customer_name VARCHAR(200) NOT NULL, customer_email VARCHAR(150), total_amount DECIMAL(10,2) NOT NULL, status ENUM('pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled') DEFAULT 'pending', created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, confirmed_by_id INT, FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE, FOREIGN KEY (distributor_id) REFERENCES users(id) ON DELETE SET NULL, FOREIGN KEY (confirmed_by_id) REFERENCES users(id) ON DELETE SET NULL) ENGINE=InnoDB;")
             cursor.execute("CREATE TABLE IF NOT EXISTS order_items (id INT AUTO_INCREMENT PRIMARY KEY, order_id INT NOT NULL, product_id INT NOT NULL, quantity INT NOT NULL, unit_price DECIMAL(10,2) NOT NULL, FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE, FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE) ENGINE=InnoDB;")
+            cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT PRIMARY KEY) ENGINE=InnoDB;")
             cursor.execute("CREATE TABLE IF NOT EXISTS distributor_sellers (distributor_id INT NOT NULL, seller_id INT NOT NULL, FOREIGN KEY (distributor_id) REFERENCES users(id) ON DELETE CASCADE, FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE, PRIMARY KEY (distributor_id, seller_id)) ENGINE=InnoDB;")
+            # Dashboard lookups: orders newest-first per seller, distributor and overall, and inventory per owner.
+            self.ensure_index(cursor, 'orders', 'idx_orders_seller_created', 'seller_id, created_at')
+            self.ensure_index(cursor, 'orders', 'idx_orders_created', 'created_at')
+            self.ensure_index(cursor, 'orders', 'idx_orders_dist_created', 'distributor_id, created_at')
+            self.ensure_index(cursor, 'inventory', 'idx_inventory_owner', 'owner_id, owner_type, product_id')
             conn.commit()
-            print("  - All tables are present.")
+            print("  - All tables and indexes are present.")
+            return True
         except mysql.connector.Error as err:
             print(f"❌ Error during table creation: {err}")
             conn.rollback()
         finally:
             cursor.close()
-            conn.close()
+            self.release(conn)
+
+    def schema_is_current(self):
+        """Checks the sentinel row written after a complete bootstrap; a missing table just means a fresh database."""
+        with self.ro() as (cursor, conn):
+            try: cursor.execute("SELECT 1 FROM schema_version WHERE version = %s LIMIT 1", (SCHEMA_VERSION,))
+            except mysql.connector.ProgrammingError as err:
+                if err.errno == errorcode.ER_NO_SUCH_TABLE: return False
+                raise
+            return bool(cursor.fetchall())
+
+    def mark_schema_current(self):
+        with self.txn() as (cursor, conn):
+            cursor.execute("INSERT IGNORE INTO schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
+        print(f"  - Recorded schema version {SCHEMA_VERSION}.")
+
+    def ensure_index(self, cursor, table, index_name, columns):
+        """Creates an index unless it exists; CREATE INDEX IF NOT EXISTS is unavailable before MySQL 8.0.29."""
+        cursor.execute("SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1", (table, index_name))
+        if not cursor.fetchone():
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+            print(f"  - Created index {index_name} on {table}.")
 
     def insert_sample_data(self):
         """Inserts sample data only if the 'users' table is empty."""
         conn = self.get_connection()
         if not conn: return
-        cursor = conn.cursor()
+        cursor = conn.cursor(buffered=True)
         try:
-            cursor.execute("SELECT COUNT(*) FROM users")
-            if cursor.fetchone()[0] > 0:
+            cursor.execute("SELECT 1 FROM users LIMIT 1")
+            if cursor.fetchone():
                 print("  - Database already contains data. Skipping sample data insertion.")
-                return
+                return True
 
             print("  - Database is empty. Inserting sample data...")
             users = [ 
@@ -104,249 +258,401 @@ class DatabaseManager:
                 (2, 'metro_dist', 'dist@metro.com', generate_password_hash('pass'), 'distributor', 'Metro Distribution'), 
                 (4, 'comfort_store', 'seller@comfort.com', generate_password_hash('pass'), 'seller', 'The Comfort Store') 
             ]
-            cursor.executemany("INSERT INTO users (id, username, email, password, user_type, company_name) VALUES (%s, %s, %s, %s, %s, %s)", users)
+            bulk_insert(cursor, "INSERT INTO users (id, username, email, password, user_type, company_name)", users)
             products = [ (1, 'Ultra Soft Fleece Blanket', 'USF-001', 'Fleece', 'Queen', 'Blue', 45.99, 1), (2, 'Premium Wool Blanket', 'PWB-002', 'Wool', 'King', 'Gray', 89.99, 1), (3, 'Cotton Comfort Throw', 'CCT-003', 'Cotton', 'Throw', 'Beige', 29.99, 1) ]
-            cursor.executemany("INSERT INTO products (id, name, model, material, size, color, price, manufacturer_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", products)
+            bulk_insert(cursor, "INSERT INTO products (id, name, model, material, size, color, price, manufacturer_id)", products)
             inventory = [ (1, 1, 1, 'manufacturer', 500), (2, 2, 1, 'manufacturer', 300), (3, 3, 1, 'manufacturer', 750), (4, 1, 2, 'distributor', 50), (5, 2, 2, 'distributor', 30), (6, 1, 4, 'seller', 10), (7, 2, 4, 'seller', 5) ]
-            cursor.executemany("INSERT INTO inventory (id, product_id, owner_id, owner_type, quantity) VALUES (%s, %s, %s, %s, %s)", inventory)
+            bulk_insert(cursor, "INSERT INTO inventory (id, product_id, owner_id, owner_type, quantity)", inventory)
             cursor.execute("INSERT INTO distributor_sellers (distributor_id, seller_id) VALUES (2, 4)")
             conn.commit()
             print("  - Sample data inserted successfully.")
+            return True
         except mysql.connector.Error as err:
             print(f"❌ Error inserting sample data: {err}")
             conn.rollback()
         finally:
             cursor.close()
-            conn.close()
+            self.release(conn)
+
+
+db = DatabaseManager()
 
 
 # SERVICE LAYER
 
+# Dashboard payloads are memoized per user and dropped by every write path that changes them.
+cache = Cache(config={'CACHE_TYPE': 'SimpleCache'})
+DASHBOARD_CACHE_TIMEOUT = 30
+# Orders are the only dashboard list that grows without bound, so they are paged by a (created_at, id) keyset.
+DASHBOARD_PAGE_SIZE, DASHBOARD_MAX_PAGE_SIZE = 50, 200
+# Only create_product changes the catalog, and it drops the cached copy.
+CATALOG_CACHE_KEY, CATALOG_CACHE_TIMEOUT = 'product_catalog', 600
+# Verified logins are remembered under a salted digest of the password, never the password itself.
+LOGIN_CACHE_TIMEOUT = 600
+LOGIN_CACHE_SALT = os.urandom(16)
+# Serialized once: failed logins are what a password-guessing client hammers.
+INVALID_LOGIN_BODY = orjson.dumps({'error': 'Invalid username or password'})
+# Readable by the page script so it only prefetches the dashboard for visitors who are likely logged in.
+LOGIN_HINT_COOKIE = 'logged_in'
+
+def order_window(before, page_size):
+    """Condition and params for the orders older than the (created_at, id) cursor; the extra row tells whether more follow."""
+    if before is None: return "TRUE", (page_size + 1,)
+    created_at, order_id = before
+    return "(o.created_at < %s OR (o.created_at = %s AND o.id < %s))", (created_at, created_at, order_id, page_size + 1)
+
+def product_catalog(cursor):
+    """Every product ordered by name, cached across requests."""
+    products = cache.get(CATALOG_CACHE_KEY)
+    if products is None:
+        cursor.execute("SELECT id, name, model, price, manufacturer_id FROM products ORDER BY name")
+        products = cursor.fetchall()
+        cache.set(CATALOG_CACHE_KEY, products, timeout=CATALOG_CACHE_TIMEOUT)
+    return products
+
+def format_orders(orders):
+    """Adds the formatted date and amount strings the order tables show."""
+    for order in orders:
+        order['created_at_fmt'] = order['created_at'].strftime('%Y-%m-%d')
+        if 'total_amount' in order: order['total_amount_fmt'] = f"${order['total_amount']:.2f}"
+    return orders
+
+def _json_default(obj):
+    if isinstance(obj, Decimal): return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps_json(obj):
+    """orjson bytes; Decimals serialize as strings, like jsonify."""
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NAIVE_UTC)
+
+def ojsonify(obj, status=200):
+    """orjson-backed jsonify; already-serialized bytes are sent as they are."""
+    return Response(obj if isinstance(obj, bytes) else dumps_json(obj), status=status, mimetype='application/json')
+
 class BaseService:
-    db = DatabaseManager()
     def handle_error(self, e, operation):
-        traceback.print_exc()
-        return jsonify({'error': f'An error occurred during {operation}.', 'details': str(e)}), 500
+        log.exception("Error during %s", operation)
+        return ojsonify({'error': f'An error occurred during {operation}.', 'details': str(e)}, 500)
+
+    def dashboard_page(self, user_id, before, page_size):
+        """Serialized JSON for one dashboard page; only the default first page is memoized."""
+        if before is None and page_size == DASHBOARD_PAGE_SIZE: return self.dashboard_payload(user_id)
+        return self.dashboard_payload.uncached(self, user_id, before, page_size)
 
 class AuthenticationService(BaseService):
     def login(self, username, password):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT id, username, password, user_type, company_name FROM users WHERE username = %s", (username,))
-            user = cursor.fetchone()
-            if user and check_password_hash(user['password'], password):
-                session.clear()
-                session['user_id'], session['user_type'], session['username'], session['company_name'] = user['id'], user['user_type'], user['username'], user['company_name']
-                return jsonify({'success': True, 'message': 'Login successful.','user': { 'id': user['id'], 'type': user['user_type'], 'username': user['username'], 'company_name': user['company_name'] }})
-            return jsonify({'error': 'Invalid username or password'}), 401
-        except mysql.connector.Error as e: return self.handle_error(e, "logging in")
-        finally: conn.close()
+        # A cache hit skips the user SELECT and the slow PBKDF2 check; failures are never cached.
+        cache_key = f"login:{username}:{hashlib.sha256(LOGIN_CACHE_SALT + password.encode()).hexdigest()}"
+        user = cache.get(cache_key)
+        if user is None:
+            try:
+                with db.ro(dictionary=True) as (cursor, conn):
+                    cursor.execute("SELECT id, username, password, user_type, company_name FROM users WHERE username = %s", (username,))
+                    user = cursor.fetchone()
+            except mysql.connector.Error as e: return self.handle_error(e, "logging in")
+            if not user or not check_password_hash(user.pop('password'), password): return ojsonify(INVALID_LOGIN_BODY, 401)
+            cache.set(cache_key, user, timeout=LOGIN_CACHE_TIMEOUT)
+        session.clear()
+        session['user_id'], session['user_type'], session['username'], session['company_name'] = user['id'], user['user_type'], user['username'], user['company_name']
+        response = ojsonify({'success': True, 'message': 'Login successful.','user': { 'id': user['id'], 'type': user['user_type'], 'username': user['username'], 'company_name': user['company_name'] }})
+        response.set_cookie(LOGIN_HINT_COOKIE, '1', samesite='Lax', secure=app.config['SESSION_COOKIE_SECURE'])
+        return response
 
     def logout(self):
         session.clear()
-        return jsonify({'success': True, 'message': 'You have been logged out.'})
+        response = ojsonify({'success': True, 'message': 'You have been logged out.'})
+        response.delete_cookie(LOGIN_HINT_COOKIE)
+        return response
 
     def get_session(self):
-        if 'user_id' in session:
-            return jsonify({'is_logged_in': True, 'user': { 'id': session['user_id'], 'type': session['user_type'], 'username': session['username'], 'company_name': session['company_name'] }})
-        return jsonify({'is_logged_in': False})
+        user = current_user()
+        if user: return ojsonify({'is_logged_in': True, 'user': user})
+        return ojsonify({'is_logged_in': False})
 
 class ManufacturerService(BaseService):
-    def get_dashboard_data(self, user_id):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT i.product_id, p.name, p.model, i.quantity FROM inventory i JOIN products p ON i.product_id = p.id WHERE i.owner_id = %s ORDER BY p.name", (user_id,))
-            inventory = cursor.fetchall()
-            cursor.execute("SELECT o.id, o.order_number, u_seller.company_name as seller, u_dist.company_name as distributor, o.status, o.created_at FROM orders o JOIN users u_seller ON o.seller_id = u_seller.id LEFT JOIN users u_dist ON o.distributor_id = u_dist.id ORDER BY o.created_at DESC")
-            orders = cursor.fetchall()
-            return jsonify({'inventory': inventory, 'orders': orders})
+    @cache.memoize(timeout=DASHBOARD_CACHE_TIMEOUT)
+    def dashboard_payload(self, user_id, before=None, page_size=DASHBOARD_PAGE_SIZE):
+        with db.ro(dictionary=True) as (cursor, conn):
+            condition, window = order_window(before, page_size)
+            cursor.execute(f"SELECT i.product_id, p.name, p.model, i.quantity FROM inventory i JOIN products p ON i.product_id = p.id WHERE i.owner_id = %s ORDER BY p.name; SELECT o.id, o.order_number, u_seller.company_name as seller, u_dist.company_name as distributor, o.status, o.created_at FROM orders o JOIN users u_seller ON o.seller_id = u_seller.id LEFT JOIN users u_dist ON o.distributor_id = u_dist.id WHERE {condition} ORDER BY o.created_at DESC, o.id DESC LIMIT %s", (user_id, *window))
+            inventory, orders = (rows for _, rows in cursor.fetchsets())
+        return dumps_json({'inventory': inventory, 'orders': format_orders(orders[:page_size]), 'has_more_orders': len(orders) > page_size})
+
+    def get_dashboard_data(self, user_id, before=None, page_size=DASHBOARD_PAGE_SIZE):
+        try: return ojsonify(self.dashboard_page(user_id, before, page_size))
         except mysql.connector.Error as e: return self.handle_error(e, "fetching manufacturer data")
-        finally: conn.close()
 
-    def create_product(self, user_id, data):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
+    def create_product(self, user_id, name, model, material, size, color, price, initial_stock):
         try:
-            name, model, price, initial_stock = data.get('name'), data.get('model'), Decimal(data.get('price')), int(data.get('initial_stock'))
-            if not all([name, model, price, initial_stock is not None]): return jsonify({'error': 'Missing required fields'}), 400
-            conn.start_transaction()
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO products (name, model, material, size, color, price, manufacturer_id) VALUES (%s, %s, %s, %s, %s, %s, %s)", (name, model, data.get('material'), data.get('size'), data.get('color'), price, user_id))
-            product_id = cursor.lastrowid
-            cursor.execute("INSERT INTO inventory (product_id, owner_id, owner_type, quantity) VALUES (%s, %s, 'manufacturer', %s)", (product_id, user_id, initial_stock))
-            conn.commit()
-            return jsonify({'success': True, 'message': f"Product '{name}' created!", 'product_id': product_id})
-        except (mysql.connector.Error, InvalidOperation, ValueError) as e: conn.rollback(); return self.handle_error(e, "creating product")
-        finally: conn.close()
+            with db.txn() as (cursor, conn):
+                # The stock row picks up the new product id server-side via LAST_INSERT_ID().
+                cursor.execute("INSERT INTO products (name, model, material, size, color, price, manufacturer_id) VALUES (%s, %s, %s, %s, %s, %s, %s); INSERT INTO inventory (product_id, owner_id, owner_type, quantity) VALUES (LAST_INSERT_ID(), %s, 'manufacturer', %s)", (name, model, material, size, color, price, user_id, user_id, initial_stock))
+                product_id = cursor.lastrowid
+                while cursor.nextset(): pass
+        except mysql.connector.Error as e: return self.handle_error(e, "creating product")
+        cache.delete(CATALOG_CACHE_KEY)
+        cache.delete_memoized(self.dashboard_payload, user_id)
+        cache.delete_memoized(dist_service.dashboard_payload)
+        cache.delete_memoized(seller_service.dashboard_payload)
+        return ojsonify({'success': True, 'message': f"Product '{name}' created!", 'product_id': product_id})
 
     def update_inventory(self, product_id, quantity, user_id):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
         try:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE inventory SET quantity = %s WHERE product_id = %s AND owner_id = %s", (quantity, product_id, user_id))
-            conn.commit()
-            if cursor.rowcount == 0: return jsonify({'error': 'Product not found or quantity is the same'}), 404
-            return jsonify({'success': True, 'message': 'Inventory updated successfully.'})
-        except mysql.connector.Error as e: conn.rollback(); return self.handle_error(e, "updating inventory")
-        finally: conn.close()
+            with db.txn() as (cursor, conn):
+                cursor.execute("UPDATE inventory SET quantity = %s WHERE product_id = %s AND owner_id = %s AND owner_type = 'manufacturer'", (quantity, product_id, user_id))
+                if cursor.rowcount == 0: conn.rollback(); return ojsonify({'error': 'Product not found.'}, 404)
+        except mysql.connector.Error as e: return self.handle_error(e, "updating inventory")
+        cache.delete_memoized(self.dashboard_payload, user_id)
+        cache.delete_memoized(dist_service.dashboard_payload)
+        return ojsonify({'success': True, 'message': 'Inventory updated successfully.'})
         
 class DistributorService(BaseService):
-    def get_dashboard_data(self, user_id):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT p.id, p.name, p.model, p.price, COALESCE(i.quantity, 0) as your_stock, (SELECT quantity FROM inventory mi WHERE mi.product_id = p.id AND mi.owner_type = 'manufacturer') as manufacturer_stock FROM products p LEFT JOIN inventory i ON p.id = i.product_id AND i.owner_id = %s ORDER BY p.name", (user_id,))
-            inventory = cursor.fetchall()
-            cursor.execute("SELECT o.id, o.order_number, u_seller.company_name AS seller, o.status, o.created_at, o.customer_name FROM orders o JOIN users u_seller ON o.seller_id = u_seller.id WHERE o.distributor_id = %s ORDER BY o.created_at DESC", (user_id,))
-            orders = cursor.fetchall()
-            return jsonify({'inventory': inventory, 'orders': orders})
+    @cache.memoize(timeout=DASHBOARD_CACHE_TIMEOUT)
+    def dashboard_payload(self, user_id, before=None, page_size=DASHBOARD_PAGE_SIZE):
+        with db.ro(dictionary=True) as (cursor, conn):
+            inventory = product_catalog(cursor)
+            condition, window = order_window(before, page_size)
+            cursor.execute(f"SELECT product_id, owner_type, quantity FROM inventory WHERE (owner_id = %s AND owner_type = 'distributor') OR owner_type = 'manufacturer'; SELECT o.id, o.order_number, u_seller.company_name AS seller, o.status, o.created_at, o.customer_name FROM orders o JOIN users u_seller ON o.seller_id = u_seller.id WHERE o.distributor_id = %s AND {condition} ORDER BY o.created_at DESC, o.id DESC LIMIT %s", (user_id, user_id, *window))
+            stock_rows, orders = (rows for _, rows in cursor.fetchsets())
+        stock = {'distributor': {}, 'manufacturer': {}}
+        for row in stock_rows: stock[row['owner_type']][row['product_id']] = row['quantity']
+        for product in inventory: product['your_stock'], product['manufacturer_stock'] = stock['distributor'].get(product['id'], 0), stock['manufacturer'].get(product['id'], 0)
+        return dumps_json({'inventory': inventory, 'orders': format_orders(orders[:page_size]), 'has_more_orders': len(orders) > page_size})
+
+    def get_dashboard_data(self, user_id, before=None, page_size=DASHBOARD_PAGE_SIZE):
+        try: return ojsonify(self.dashboard_page(user_id, before, page_size))
         except mysql.connector.Error as e: return self.handle_error(e, "fetching distributor data")
-        finally: conn.close()
 
     def order_from_manufacturer(self, product_id, quantity, user_id):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
         try:
-            conn.start_transaction()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT quantity, owner_id FROM inventory WHERE product_id = %s AND owner_type = 'manufacturer' FOR UPDATE", (product_id,))
-            mfg_inv = cursor.fetchone()
-            if not mfg_inv or mfg_inv['quantity'] < quantity: conn.rollback(); return jsonify({'error': 'Insufficient manufacturer stock.'}), 400
-            cursor.execute("UPDATE inventory SET quantity = quantity - %s WHERE product_id = %s AND owner_id = %s", (quantity, product_id, mfg_inv['owner_id']))
-            cursor.execute("INSERT INTO inventory (product_id, owner_id, owner_type, quantity) VALUES (%s, %s, 'distributor', %s) ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)", (product_id, user_id, quantity))
-            conn.commit()
-            return jsonify({'success': True, 'message': f'Successfully ordered {quantity} units.'})
-        except mysql.connector.Error as e: conn.rollback(); return self.handle_error(e, "ordering from manufacturer")
-        finally: conn.close()
+            with db.txn() as (cursor, conn):
+                cursor.execute("SELECT manufacturer_id FROM products WHERE id = %s", (product_id,))
+                product = cursor.fetchone()
+                if not product: conn.rollback(); return ojsonify({'error': 'Product not found.'}, 404)
+                manufacturer_id = product[0]
+                # Checks and takes the stock in one statement; the full unique key locks just that record.
+                cursor.execute("UPDATE inventory SET quantity = quantity - %s WHERE product_id = %s AND owner_id = %s AND owner_type = 'manufacturer' AND quantity >= %s", (quantity, product_id, manufacturer_id, quantity))
+                if cursor.rowcount == 0: conn.rollback(); return ojsonify({'error': 'Insufficient manufacturer stock.'}, 400)
+                cursor.execute("INSERT INTO inventory (product_id, owner_id, owner_type, quantity) VALUES (%s, %s, 'distributor', %s) ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)", (product_id, user_id, quantity))
+        except mysql.connector.Error as e: return self.handle_error(e, "ordering from manufacturer")
+        cache.delete_memoized(mfg_service.dashboard_payload, manufacturer_id)
+        cache.delete_memoized(self.dashboard_payload, user_id)
+        cache.delete_memoized(seller_service.dashboard_payload)
+        return ojsonify({'success': True, 'message': f'Successfully ordered {quantity} units.'})
         
 class SellerService(BaseService):
-    def get_dashboard_data(self, user_id):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT p.id, p.name, p.model, p.price, p.manufacturer_id, COALESCE(si.quantity, 0) as seller_stock, COALESCE(di.quantity, 0) as distributor_stock FROM products p LEFT JOIN inventory si ON p.id = si.product_id AND si.owner_id = %s LEFT JOIN distributor_sellers ds ON ds.seller_id = %s LEFT JOIN inventory di ON p.id = di.product_id AND di.owner_id = ds.distributor_id ORDER BY p.name", (user_id, user_id))
-            products = cursor.fetchall()
-            cursor.execute("SELECT o.*, u_confirmer.company_name AS confirmer_name FROM orders o LEFT JOIN users u_confirmer ON o.confirmed_by_id = u_confirmer.id WHERE o.seller_id = %s ORDER BY o.created_at DESC", (user_id,))
-            orders = cursor.fetchall()
-            return jsonify({'products': products, 'orders': orders})
+    # seller_id -> distributor_id; sellers are never reassigned, so entries live for the process.
+    distributor_ids = {}
+
+    def distributor_for(self, conn, seller_id):
+        """The seller's distributor id, read on the caller's connection only on a cache miss."""
+        if seller_id not in self.distributor_ids:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT distributor_id FROM distributor_sellers WHERE seller_id = %s", (seller_id,))
+                dist_res = cursor.fetchone()
+            if not dist_res: return None
+            self.distributor_ids[seller_id] = dist_res[0]
+        return self.distributor_ids[seller_id]
+
+    @cache.memoize(timeout=DASHBOARD_CACHE_TIMEOUT)
+    def dashboard_payload(self, user_id, before=None, page_size=DASHBOARD_PAGE_SIZE):
+        with db.ro(dictionary=True) as (cursor, conn):
+            distributor_id, products = self.distributor_for(conn, user_id), product_catalog(cursor)
+            condition, window = order_window(before, page_size)
+            cursor.execute(f"SELECT product_id, owner_type, quantity FROM inventory WHERE (owner_id = %s AND owner_type = 'seller') OR (owner_id = %s AND owner_type = 'distributor'); SELECT o.*, u_confirmer.company_name AS confirmer_name FROM orders o LEFT JOIN users u_confirmer ON o.confirmed_by_id = u_confirmer.id WHERE o.seller_id = %s AND {condition} ORDER BY o.created_at DESC, o.id DESC LIMIT %s", (user_id, distributor_id, user_id, *window))
+            stock_rows, orders = (rows for _, rows in cursor.fetchsets())
+        stock = {'seller': {}, 'distributor': {}}
+        for row in stock_rows: stock[row['owner_type']][row['product_id']] = row['quantity']
+        for product in products: product['seller_stock'], product['distributor_stock'] = stock['seller'].get(product['id'], 0), stock['distributor'].get(product['id'], 0)
+        return dumps_json({'products': products, 'orders': format_orders(orders[:page_size]), 'has_more_orders': len(orders) > page_size})
+
+    def get_dashboard_data(self, user_id, before=None, page_size=DASHBOARD_PAGE_SIZE):
+        try: return ojsonify(self.dashboard_page(user_id, before, page_size))
         except mysql.connector.Error as e: return self.handle_error(e, "fetching seller data")
-        finally: conn.close()
 
     def order_from_distributor(self, user_id, product_id, quantity):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
         try:
-            conn.start_transaction()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT distributor_id FROM distributor_sellers WHERE seller_id = %s", (user_id,))
-            dist_res = cursor.fetchone()
-            if not dist_res: return jsonify({'error': 'You are not assigned to a distributor.'}), 400
-            distributor_id = dist_res['distributor_id']
-            cursor.execute("SELECT quantity FROM inventory WHERE product_id = %s AND owner_id = %s AND owner_type = 'distributor' FOR UPDATE", (product_id, distributor_id))
-            dist_inv = cursor.fetchone()
-            if not dist_inv or dist_inv['quantity'] < quantity: conn.rollback(); return jsonify({'error': 'Insufficient distributor stock.'}), 400
-            cursor.execute("UPDATE inventory SET quantity = quantity - %s WHERE product_id = %s AND owner_id = %s", (quantity, product_id, distributor_id))
-            cursor.execute("INSERT INTO inventory (product_id, owner_id, owner_type, quantity) VALUES (%s, %s, 'seller', %s) ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)", (product_id, user_id, quantity))
-            conn.commit()
-            return jsonify({'success': True, 'message': f'Successfully ordered {quantity} units.'})
-        except mysql.connector.Error as e: conn.rollback(); return self.handle_error(e, "ordering from distributor")
-        finally: conn.close()
-
-    def create_order(self, user_id, order_data):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
+            with db.txn() as (cursor, conn):
+                distributor_id = self.distributor_for(conn, user_id)
+                if not distributor_id: return ojsonify({'error': 'You are not assigned to a distributor.'}, 400)
+                cursor.execute("UPDATE inventory SET quantity = quantity - %s WHERE product_id = %s AND owner_id = %s AND owner_type = 'distributor' AND quantity >= %s", (quantity, product_id, distributor_id, quantity))
+                if cursor.rowcount == 0: conn.rollback(); return ojsonify({'error': 'Insufficient distributor stock.'}, 400)
+                cursor.execute("INSERT INTO inventory (product_id, owner_id, owner_type, quantity) VALUES (%s, %s, 'seller', %s) ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)", (product_id, user_id, quantity))
+        except mysql.connector.Error as e: return self.handle_error(e, "ordering from distributor")
+        cache.delete_memoized(dist_service.dashboard_payload, distributor_id)
+        cache.delete_memoized(self.dashboard_payload)
+        return ojsonify({'success': True, 'message': f'Successfully ordered {quantity} units.'})
+
+    def create_order(self, user_id, customer_name, customer_email, items):
+        # Only ids and quantities are taken from the client; prices come from the products table below.
+        requested = {}
+        for product_id, quantity in items: requested[product_id] = requested.get(product_id, 0) + quantity
+        # The random suffix keeps two orders placed in the same second from sharing a number.
+        order_number = f"ORD-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(3)}"
         try:
-            conn.start_transaction()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT distributor_id FROM distributor_sellers WHERE seller_id = %s", (user_id,))
-            dist_res = cursor.fetchone()
-            if not dist_res: return jsonify({'error': 'You are not assigned to a distributor.'}), 400
-            distributor_id = dist_res['distributor_id']
-            total_amount = Decimal('0.0')
-            for item in order_data['items']:
-                try:
-                    quantity, price = int(item['quantity']), Decimal(str(item['price']))
-                    if quantity > 0: total_amount += quantity * price
-                except (InvalidOperation, ValueError, TypeError): conn.rollback(); return jsonify({'error': f"Invalid data for product_id {item.get('product_id')}."}), 400
-            for item in order_data['items']:
-                quantity = int(item['quantity']);
-                if quantity <= 0: continue
-                cursor.execute("SELECT name FROM products WHERE id = %s", (item['product_id'],))
-                product_name = cursor.fetchone()['name']
-                cursor.execute("SELECT COALESCE(SUM(quantity), 0) as total_stock FROM inventory WHERE product_id = %s AND ((owner_id = %s AND owner_type='seller') OR (owner_id = %s AND owner_type='distributor'))", (item['product_id'], user_id, distributor_id))
-                total_stock = cursor.fetchone()['total_stock']
-                if total_stock < quantity: conn.rollback(); return jsonify({'error': f"Out of stock for '{product_name}'. Requested: {quantity}, Available: {int(total_stock)}."}), 400
-            for item in order_data['items']:
-                qty_to_deduct = int(item['quantity']);
-                if qty_to_deduct <= 0: continue
-                cursor.execute("SELECT quantity FROM inventory WHERE product_id = %s AND owner_id = %s FOR UPDATE", (item['product_id'], user_id))
-                seller_inv = cursor.fetchone(); seller_stock = seller_inv['quantity'] if seller_inv else 0
-                deduct_from_seller = min(qty_to_deduct, seller_stock)
-                if deduct_from_seller > 0:
-                    cursor.execute("UPDATE inventory SET quantity = quantity - %s WHERE product_id = %s AND owner_id = %s", (deduct_from_seller, item['product_id'], user_id))
-                    qty_to_deduct -= deduct_from_seller
-                if qty_to_deduct > 0:
-                    cursor.execute("UPDATE inventory SET quantity = quantity - %s WHERE product_id = %s AND owner_id = %s", (qty_to_deduct, item['product_id'], distributor_id))
-            order_number = f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            cursor.execute("INSERT INTO orders (order_number, seller_id, distributor_id, customer_name, customer_email, total_amount) VALUES (%s, %s, %s, %s, %s, %s)", (order_number, user_id, distributor_id, order_data['customer_name'], order_data['customer_email'], total_amount))
-            order_id = cursor.lastrowid
-            item_values = [(order_id, i['product_id'], int(i['quantity']), Decimal(str(i['price']))) for i in order_data['items'] if int(i.get('quantity',0)) > 0]
-            cursor.executemany("INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES (%s, %s, %s, %s)", item_values)
-            conn.commit()
-            return jsonify({'success': True, 'message': f'Order {order_number} created successfully!'})
-        except (mysql.connector.Error, InvalidOperation, ValueError, TypeError) as e: conn.rollback(); return self.handle_error(e, "creating order")
-        finally: conn.close()
+            with db.txn(dictionary=True) as (cursor, conn):
+                distributor_id = self.distributor_for(conn, user_id)
+                if not distributor_id: return ojsonify({'error': 'You are not assigned to a distributor.'}, 400)
+                stock = {}
+                # One locking read covers every line item's price and both stock rows.
+                placeholders = ", ".join(["%s"] * len(requested))
+                cursor.execute(f"SELECT p.id, p.name, p.price, inv.owner_type, inv.quantity FROM products p LEFT JOIN inventory inv ON inv.product_id = p.id AND ((inv.owner_id = %s AND inv.owner_type = 'seller') OR (inv.owner_id = %s AND inv.owner_type = 'distributor')) WHERE p.id IN ({placeholders}) FOR UPDATE", (user_id, distributor_id, *requested))
+                for row in cursor.fetchall():
+                    entry = stock.setdefault(row['id'], {'name': row['name'], 'price': row['price'], 'seller': 0, 'distributor': 0})
+                    if row['owner_type']: entry[row['owner_type']] = row['quantity']
+                # Seller stock drains first; the distributor covers the rest.
+                seller_deductions, distributor_deductions = {}, {}
+                for product_id, quantity in requested.items():
+                    if product_id not in stock: return ojsonify({'error': f"Invalid data for product_id {product_id}."}, 400)
+                    entry = stock[product_id]; total_stock = entry['seller'] + entry['distributor']
+                    if total_stock < quantity: return ojsonify({'error': f"Out of stock for '{entry['name']}'. Requested: {quantity}, Available: {int(total_stock)}."}, 400)
+                    deduct_from_seller = min(quantity, entry['seller'])
+                    if deduct_from_seller > 0: seller_deductions[product_id] = deduct_from_seller
+                    if quantity > deduct_from_seller: distributor_deductions[product_id] = quantity - deduct_from_seller
+                lines = [(product_id, quantity, stock[product_id]['price']) for product_id, quantity in requested.items()]
+                cursor.execute(*order_batch(user_id, distributor_id, order_number, customer_name, customer_email, lines, seller_deductions, distributor_deductions))
+                while cursor.nextset(): pass
+        except mysql.connector.Error as e: return self.handle_error(e, "creating order")
+        cache.delete_memoized(mfg_service.dashboard_payload)
+        cache.delete_memoized(dist_service.dashboard_payload, distributor_id)
+        cache.delete_memoized(self.dashboard_payload)
+        return ojsonify({'success': True, 'message': f'Order {order_number} created successfully!'})
 
 class OrderService(BaseService):
     def update_status(self, order_id, status, user_id):
-        conn = self.db.get_connection()
-        if not conn: return jsonify({'error': 'DB connection failed'}), 500
         try:
-            cursor = conn.cursor()
-            if status == 'confirmed':
-                cursor.execute("UPDATE orders SET status = %s, confirmed_by_id = %s WHERE id = %s AND status = 'pending'", (status, user_id, order_id))
-            else:
-                cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (status, order_id))
-            conn.commit()
-            if cursor.rowcount == 0: return jsonify({'error': 'Order not found or status cannot be updated.'}), 404
-            return jsonify({'success': True, 'message': f'Order status updated to {status}.'})
-        except mysql.connector.Error as e: conn.rollback(); return self.handle_error(e, "updating order status")
-        finally: conn.close()
+            with db.txn() as (cursor, conn):
+                if status == 'confirmed':
+                    cursor.execute("UPDATE orders SET status = %s, confirmed_by_id = %s WHERE id = %s AND status = 'pending'", (status, user_id, order_id))
+                else:
+                    cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (status, order_id))
+                if cursor.rowcount == 0: conn.rollback(); return ojsonify({'error': 'Order not found or status cannot be updated.'}, 404)
+        except mysql.connector.Error as e: return self.handle_error(e, "updating order status")
+        for service in (mfg_service, dist_service, seller_service): cache.delete_memoized(service.dashboard_payload)
+        return ojsonify({'success': True, 'message': f'Order status updated to {status}.'})
 
 
 # FLASK APP & ROUTES
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24) 
+# A stable key keeps session cookies valid across restarts; the random fallback is for local development only.
+app.secret_key = os.environ.get('FLASK_SECRET_KEY', '').encode() or os.urandom(32)
+app.config.update(SESSION_COOKIE_SAMESITE='Lax', SESSION_COOKIE_SECURE=os.environ.get('SESSION_COOKIE_SECURE') == '1')
 CORS(app, supports_credentials=True)
+cache.init_app(app)
+# Low-level Brotli gets most of the savings on repetitive JSON and HTML for little CPU.
+app.config.update(COMPRESS_ALGORITHM=['br', 'gzip'], COMPRESS_BR_LEVEL=4, COMPRESS_MIN_SIZE=500, COMPRESS_REGISTER=False)
+compress = Compress(app)
+
+@app.after_request
+def compress_response(response):
+    """Flask-Compress picks an encoding even when every one is q=0, so such requests bypass it."""
+    if request.accept_encodings.best_match(app.config['COMPRESS_ALGORITHM']) is None: response.vary.add('Accept-Encoding'); return response
+    return compress.after_request(response)
 
 auth_service, mfg_service, dist_service, seller_service, order_service = AuthenticationService(), ManufacturerService(), DistributorService(), SellerService(), OrderService()
+dashboard_services = {'manufacturer': mfg_service, 'distributor': dist_service, 'seller': seller_service}
+
+def current_user():
+    """The logged-in user, read from the session on first use and kept on g for the rest of the request."""
+    if 'user' not in g: g.user = { 'id': session['user_id'], 'type': session['user_type'], 'username': session['username'], 'company_name': session['company_name'] } if 'user_id' in session else None
+    return g.user
+
+# Constant error bodies are serialized once; each request still gets its own Response since CORS adds headers to it.
+AUTH_REQUIRED_BODY = orjson.dumps({'error': 'Authentication required. Please log in.'})
+FORBIDDEN_BODY = orjson.dumps({'error': 'Unauthorized for this role'})
+BAD_REQUEST_BODY = orjson.dumps({'error': 'Missing or invalid fields in request body.'})
+INVALID_USER_TYPE_BODY = orjson.dumps({'error': 'Invalid user type'})
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session: return jsonify({'error': 'Authentication required. Please log in.'}), 401
+        if not current_user(): return ojsonify(AUTH_REQUIRED_BODY, 401)
         return f(*args, **kwargs)
     return decorated_function
 
-def role_required(allowed_roles):
+def role_required(*allowed_roles):
+    """Also enforces login, so routes need only this one decorator."""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if session.get('user_type') not in allowed_roles: return jsonify({'error': 'Unauthorized for this role'}), 403
+            user = current_user()
+            if not user: return ojsonify(AUTH_REQUIRED_BODY, 401)
+            if user['type'] not in allowed_roles: return ojsonify(FORBIDDEN_BODY, 403)
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+def text(value):
+    if not isinstance(value, str): raise TypeError(value)
+    return value
+
+def required_text(value):
+    if not text(value).strip(): raise ValueError(value)
+    return value
+
+def optional_text(value):
+    return None if value is None else text(value)
+
+def integer(value):
+    """A JSON integer or a string of digits; bools, floats and anything else raise ValueError."""
+    if isinstance(value, int) and not isinstance(value, bool): return value
+    if isinstance(value, str) and re.fullmatch(r'\s*[+-]?\d+\s*', value): return int(value)
+    raise ValueError(value)
+
+def positive_int(value):
+    value = integer(value)
+    if value <= 0: raise ValueError(value)
+    return value
+
+def non_negative_int(value):
+    value = integer(value)
+    if value < 0: raise ValueError(value)
+    return value
+
+def positive_price(value):
+    try: price = Decimal(str(value))
+    except InvalidOperation: raise ValueError(value)
+    if not price.is_finite() or price <= 0: raise ValueError(value)
+    return price
+
+def order_items(value):
+    """[(product_id, quantity), ...] from a non-empty list of {product_id, quantity} objects."""
+    if not isinstance(value, list) or not value: raise ValueError(value)
+    return [(positive_int(item['product_id']), positive_int(item['quantity'])) for item in value]
+
+ORDER_STATUSES = frozenset(['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled'])
+
+def order_status(value):
+    if value not in ORDER_STATUSES: raise ValueError(value)
+    return value
+
+# (field, converter) pairs for the endpoints that read individual fields from the JSON body.
+SCHEMAS = {
+    'login': (('username', text), ('password', text)),
+    'create_mfg_product': (('name', required_text), ('model', required_text), ('material', optional_text), ('size', optional_text), ('color', optional_text), ('price', positive_price), ('initial_stock', non_negative_int)),
+    'update_mfg_inventory': (('product_id', positive_int), ('quantity', non_negative_int)),
+    'stock_order': (('product_id', positive_int), ('quantity', positive_int)),
+    'update_order_status': (('status', order_status),),
+    'create_seller_order': (('customer_name', required_text), ('customer_email', optional_text), ('items', order_items)),
+}
+
+def json_body(schema):
+    """Passes the schema's converted JSON fields to the view positionally; a malformed body gets a 400."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            data = request.get_json(silent=True, cache=False)
+            if not isinstance(data, dict): return ojsonify(BAD_REQUEST_BODY, 400)
+            try: fields = [convert(data.get(name)) for name, convert in schema]
+            except (KeyError, TypeError, ValueError, OverflowError): return ojsonify(BAD_REQUEST_BODY, 400)
+            return f(*args, *fields, **kwargs)
+        return decorated_function
+    return decorator
+
 @app.route('/api/login', methods=['POST'])
-def login(): return auth_service.login(request.json['username'], request.json['password'])
+@json_body(SCHEMAS['login'])
+def login(username, password): return auth_service.login(username, password)
 @app.route('/api/logout', methods=['POST'])
 @login_required
 def logout(): return auth_service.logout()
@@ -355,135 +661,78 @@ def get_current_session(): return auth_service.get_session()
 @app.route('/api/dashboard', methods=['GET'])
 @login_required
 def get_dashboard():
-    user_id, user_type = session['user_id'], session['user_type']
-    if user_type == 'manufacturer': return mfg_service.get_dashboard_data(user_id)
-    if user_type == 'distributor': return dist_service.get_dashboard_data(user_id)
-    if user_type == 'seller': return seller_service.get_dashboard_data(user_id)
-    return jsonify({'error': 'Invalid user type'}), 400
+    user_id, service = g.user['id'], dashboard_services.get(g.user['type'])
+    if not service: return ojsonify(INVALID_USER_TYPE_BODY, 400)
+    # ?no_cache=1 is a manual refresh: drop this user's memoized payload before reading.
+    if request.args.get('no_cache') == '1': cache.delete_memoized(service.dashboard_payload, user_id)
+    page_size, before = min(max(request.args.get('page_size', DASHBOARD_PAGE_SIZE, type=int), 1), DASHBOARD_MAX_PAGE_SIZE), None
+    # Later pages name the last order already shown, so rows that arrive meanwhile cannot shift or repeat them.
+    if 'before_id' in request.args:
+        try: before = (datetime.fromisoformat(request.args['before_created_at']), int(request.args['before_id']))
+        except (KeyError, ValueError): return ojsonify(BAD_REQUEST_BODY, 400)
+    response = service.get_dashboard_data(user_id, before, page_size)
+    if response.status_code == 200:
+        # An unchanged dashboard costs a hash and a 304.
+        response.set_etag(hashlib.blake2b(response.get_data(), digest_size=8).hexdigest())
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.make_conditional(request)
+    return response
 @app.route('/api/manufacturer/product', methods=['POST'])
-@login_required
-@role_required(['manufacturer'])
-def create_mfg_product(): return mfg_service.create_product(session['user_id'], request.json)
+@role_required('manufacturer')
+@json_body(SCHEMAS['create_mfg_product'])
+def create_mfg_product(*fields): return mfg_service.create_product(g.user['id'], *fields)
 @app.route('/api/manufacturer/inventory', methods=['PUT'])
-@login_required
-@role_required(['manufacturer'])
-def update_mfg_inventory(): return mfg_service.update_inventory(request.json['product_id'], request.json['quantity'], session['user_id'])
+@role_required('manufacturer')
+@json_body(SCHEMAS['update_mfg_inventory'])
+def update_mfg_inventory(product_id, quantity): return mfg_service.update_inventory(product_id, quantity, g.user['id'])
 @app.route('/api/distributor/order', methods=['POST'])
-@login_required
-@role_required(['distributor'])
-def order_from_mfg(): return dist_service.order_from_manufacturer(request.json['product_id'], request.json['quantity'], session['user_id'])
+@role_required('distributor')
+@json_body(SCHEMAS['stock_order'])
+def order_from_mfg(product_id, quantity): return dist_service.order_from_manufacturer(product_id, quantity, g.user['id'])
 @app.route('/api/seller/stock_order', methods=['POST'])
-@login_required
-@role_required(['seller'])
-def order_from_dist(): return seller_service.order_from_distributor(session['user_id'], request.json['product_id'], request.json['quantity'])
+@role_required('seller')
+@json_body(SCHEMAS['stock_order'])
+def order_from_dist(product_id, quantity): return seller_service.order_from_distributor(g.user['id'], product_id, quantity)
 @app.route('/api/seller/order', methods=['POST'])
-@login_required
-@role_required(['seller'])
-def create_seller_order(): return seller_service.create_order(session['user_id'], request.json)
+@role_required('seller')
+@json_body(SCHEMAS['create_seller_order'])
+def create_seller_order(customer_name, customer_email, items): return seller_service.create_order(g.user['id'], customer_name, customer_email, items)
 @app.route('/api/order/<int:order_id>/status', methods=['PUT'])
-@login_required
-@role_required(['manufacturer', 'distributor'])
-def update_order_status(order_id): return order_service.update_status(order_id, request.json['status'], session['user_id'])
+@role_required('manufacturer', 'distributor')
+@json_body(SCHEMAS['update_order_status'])
+def update_order_status(status, order_id): return order_service.update_status(order_id, status, g.user['id'])
 
 
 # HTML 
 
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Cozy Comfort Management</title>
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@400;500;600;700&family=Great+Vibes&display=swap');
-        :root{--primary-color:#5A67D8;--secondary-color:#38B2AC;--bg-color:#F7FAFC;--card-bg:#FFFFFF;--text-primary:#2D3748;--text-secondary:#718096;--success:#48BB78;--warning:#ED8936;--danger:#E53E3E;--info:#4299E1;--border-color:#E2E8F0;--shadow-sm:0 1px 2px 0 rgba(0,0,0,0.05);--shadow-md:0 4px 6px -1px rgba(0,0,0,0.1),0 2px 4px -1px rgba(0,0,0,0.06);--shadow-lg:0 10px 15px -3px rgba(0,0,0,0.1),0 4px 6px -2px rgba(0,0,0,0.05);}
-        body{font-family:'Poppins',sans-serif;background-color:var(--bg-color);margin:0;color:var(--text-primary);-webkit-font-smoothing:antialiased;}
-        .container{max-width:1280px;margin:2rem auto;padding:0 1rem;}
-        .main-header{display:flex;justify-content:space-between;align-items:center;margin-bottom:2.5rem;}
-        .main-header h1{font-family:'Great Vibes',cursive;font-size:3.5rem;font-weight:400;color:var(--primary-color);text-shadow:1px 1px 2px rgba(0,0,0,0.1);margin:0;animation:fadeInDown .8s ease-out;}
-        .card{background:var(--card-bg);border-radius:12px;box-shadow:var(--shadow-md);margin-bottom:2rem;border:1px solid var(--border-color);transition:transform .3s ease,box-shadow .3s ease;animation:fadeInUp .5s ease-out forwards;opacity:0;}
-        .card:hover{transform:translateY(-5px);box-shadow:var(--shadow-lg);}
-        .card-header{padding:1.25rem 1.5rem;border-bottom:1px solid var(--border-color);display:flex;justify-content:space-between;align-items:center;}
-        .card-header h3{margin:0;font-size:1.2rem;font-weight:600;}
-        .card-content{padding:1.5rem;}
-        .user-info{display:flex;gap:1rem;align-items:center;}
-        .table{width:100%;border-collapse:collapse;}
-        .table th,.table td{padding:1rem 1.5rem;text-align:left;border-bottom:1px solid var(--border-color);}
-        .table th{background-color:var(--bg-color);font-weight:600;color:var(--text-secondary);text-transform:uppercase;font-size:.8rem;letter-spacing:.05em;}
-        .table tr:last-child td{border-bottom:none;}
-        .table td strong{color:var(--text-primary);font-weight:600;}
-        .btn{padding:.75rem 1.25rem;border:none;border-radius:8px;cursor:pointer;font-weight:600;font-size:.9rem;transition:all .3s ease;box-shadow:var(--shadow-sm);display:inline-flex;align-items:center;gap:.5rem;}
-        .btn:disabled{background-color:#A0AEC0;cursor:not-allowed;}
-        .btn:hover:not(:disabled){transform:translateY(-2px);box-shadow:var(--shadow-md);}
-        .btn-primary{background:linear-gradient(45deg,var(--primary-color),#7f9cf5);color:#fff;}
-        .btn-primary:hover:not(:disabled){background:linear-gradient(45deg,#7f9cf5,var(--primary-color));}
-        .btn-secondary{background-color:var(--bg-color);color:var(--text-primary);border:1px solid var(--border-color);}
-        .btn-secondary:hover:not(:disabled){background-color:#E2E8F0;border-color:#CBD5E0;}
-        .btn-danger{background-color:var(--danger);color:#fff;}
-        .modal{display:none;position:fixed;z-index:100;left:0;top:0;width:100%;height:100%;overflow:auto;background-color:rgba(45,55,72,.7);backdrop-filter:blur(5px);animation:fadeIn .4s ease;}
-        .modal-content{background-color:var(--card-bg);margin:8% auto;padding:2.5rem;border-radius:12px;width:90%;max-width:550px;box-shadow:var(--shadow-lg);animation:slideInUp .5s ease;}
-        .modal-content h2{margin-top:0;color:var(--primary-color);}
-        .form-grid{display:grid;grid-template-columns:repeat(auto-fit,minmax(200px,1fr));gap:1.5rem;}
-        .form-group.full-width{grid-column:1 / -1;}
-        .form-group label{display:block;margin-bottom:.5rem;font-weight:500;color:var(--text-secondary);}
-        .form-group input{width:100%;padding:.8rem 1rem;box-sizing:border-box;border-radius:8px;border:1px solid var(--border-color);font-size:1rem;background:var(--bg-color);transition:border-color .3s,box-shadow .3s;}
-        .form-group input:focus{border-color:var(--primary-color);box-shadow:0 0 0 3px rgba(90,103,216,.3);outline:none;}
-        .alert{padding:1rem 1.5rem;margin-bottom:1rem;border-radius:8px;font-weight:500;border-left:5px solid;animation:fadeInDown .5s;}
-        .alert-danger{color:#9B2C2C;background-color:#FED7D7;border-color:var(--danger);}
-        .alert-success{color:#276749;background-color:#C6F6D5;border-color:var(--success);}
-        .status{padding:.25rem .75rem;border-radius:99px;font-size:.8rem;font-weight:600;text-transform:capitalize;}
-        .status-pending{background-color:#FEF3C7;color:#9A5B22;border:1px solid #F6E05E;}
-        .status-confirmed{background-color:#C6F6D5;color:#276749;border:1px solid #68D391;}
-        .status-shipped{background-color:#BEE3F8;color:#2C5282;border:1px solid #63B3ED;}
-        .status-cancelled{background-color:#FED7D7;color:#9B2C2C;border:1px solid #FC8181;}
-        .loading-spinner{border:4px solid var(--border-color);border-top:4px solid var(--primary-color);border-radius:50%;width:50px;height:50px;animation:spin 1s linear infinite;margin:80px auto;}
-        @keyframes fadeIn{from{opacity:0}to{opacity:1}}
-        @keyframes fadeInDown{from{opacity:0;transform:translateY(-20px)}to{opacity:1;transform:translateY(0)}}
-        @keyframes fadeInUp{from{opacity:0;transform:translateY(20px)}to{opacity:1;transform:translateY(0)}}
-        @keyframes slideInUp{from{transform:translateY(50px);opacity:0}to{transform:translateY(0);opacity:1}}
-        @keyframes spin{0%{transform:rotate(0deg)}100%{transform:rotate(360deg)}}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <header class="main-header"><h1>Cozy Comfort</h1><div class="user-info" id="user-display"></div></header>
-        <main><div id="alert-container"></div><div id="content-area"></div></main>
-    </div>
-    <div id="formModal" class="modal"><div class="modal-content" id="modal-content-host"></div></div>
-    <script>
-        let productCatalog = [], currentUser = null;
-        function showAlert(message, isError = false, containerId = 'alert-container') { const container = document.getElementById(containerId); const alertType = isError ? 'alert-danger' : 'alert-success'; container.innerHTML = `<div class="alert ${alertType}">${message}</div>`; if (containerId === 'alert-container') setTimeout(() => { container.innerHTML = ''; }, 5000); }
-        async function api(endpoint, options = {}) { if (options.body) options.headers = { 'Content-Type': 'application/json', ...options.headers }; try { const response = await fetch(`/api${endpoint}`, options); const data = await response.json(); if (!response.ok) { if (response.status === 401) handleLoggedOutState(); throw new Error(data.error || 'API Request Failed'); } return data; } catch (err) { if (err instanceof SyntaxError) showAlert("An unexpected server error occurred. Please try again.", true); else showAlert(err.message, true); throw err; } }
-        async function performLogin() { const form = document.getElementById('loginForm'), btn = form.querySelector('button[type="submit"]'); btn.disabled = true; btn.textContent = 'Logging in...'; try { const data = await api('/login', { method: 'POST', body: JSON.stringify({ username: form.username.value, password: form.password.value }) }); currentUser = data.user; showAlert(data.message, false); renderUserDisplay(); loadDashboard(); closeModal(); } catch (err) { showAlert(err.message, true, 'login-alert-container'); } finally { btn.disabled = false; btn.textContent = 'Login'; } }
-        async function performLogout() { try { await api('/logout', { method: 'POST' }); handleLoggedOutState(); showAlert("You have been logged out.", false); } catch (err) {} }
-        function renderUserDisplay() { document.getElementById('user-display').innerHTML = currentUser ? `<span>Logged in as <strong>${currentUser.company_name}</strong></span><button class="btn btn-danger" onclick="performLogout()">Logout</button>` : ''; }
-        function handleLoggedOutState() { currentUser = null; renderUserDisplay(); document.getElementById('content-area').innerHTML = `<div class="card"><div class="card-header"><h3>Welcome to the Supply Chain Portal</h3></div><div class="card-content" style="text-align:center;"><p style="font-size:1.1rem; color:var(--text-secondary); margin: 1rem 0 2.5rem;">Please select your role to log in and manage your operations.</p><div style="display:flex; justify-content:center; flex-wrap: wrap; gap: 1.5rem;"><button class="btn btn-primary" onclick="openLoginModal('cozy_mfg', 'Manufacturer')">🏭 Login as Manufacturer</button><button class="btn btn-primary" onclick="openLoginModal('metro_dist', 'Distributor')">📦 Login as Distributor</button><button class="btn btn-primary" onclick="openLoginModal('comfort_store', 'Seller')">🏪 Login as Seller</button></div></div></div>`; }
-        function renderTable(headers, rows) { const head = `<thead><tr>${headers.map(h => `<th>${h}</th>`).join('')}</tr></thead>`; const body = `<tbody>${rows.map(row => `<tr>${row.map(cell => `<td>${cell}</td>`).join('')}</tr>`).join('')}</tbody>`; return `<div class="card-content" style="overflow-x:auto;"><table class="table">${head}${body}</table></div>`; }
-        async function loadDashboard() { document.getElementById('content-area').innerHTML = '<div class="loading-spinner"></div>'; if (!currentUser) { handleLoggedOutState(); return; } try { const data = await api('/dashboard'); let html = ''; if (currentUser.type === 'manufacturer') { html += `<div class="card"><div class="card-header"><h3>Inventory</h3><button class="btn btn-primary" onclick="openNewProductModal()">+ New Product</button></div>${renderTable(['Product', 'Model', 'Stock', 'Actions'], data.inventory.map(p => [p.name, p.model, `<strong>${p.quantity}</strong> units`, `<button class="btn btn-secondary" onclick='openMfgUpdateModal(${JSON.stringify(p)})'>Edit Stock</button>`]))}</div>`; html += `<div class="card"><div class="card-header"><h3>All Customer Orders</h3></div>${renderTable(['Order #', 'Seller', 'Distributor', 'Status', 'Date', 'Actions'], data.orders.map(o => [o.order_number, o.seller, o.distributor || 'N/A', `<span class="status status-${o.status}">${o.status}</span>`, new Date(o.created_at).toLocaleDateString(), o.status === 'pending' ? `<button class="btn btn-primary" onclick="updateOrderStatus(${o.id}, 'confirmed')">Confirm</button>` : 'N/A']))}</div>`; } if (currentUser.type === 'distributor') { html += `<div class="card"><div class="card-header"><h3>Inventory & Ordering</h3></div>${renderTable(['Product', 'Model', 'Price', 'Your Stock', 'Mfg. Stock', 'Actions'], data.inventory.map(p => [p.name, p.model, `$${p.price}`, `<strong>${p.your_stock}</strong>`, p.manufacturer_stock, `<button class="btn btn-primary" onclick='openDistOrderModal(${JSON.stringify(p)})'>Order More</button>`]))}</div>`; html += `<div class="card"><div class="card-header"><h3>Customer Orders to Fulfill</h3></div>${renderTable(['Order #', 'Customer', 'From Seller', 'Status', 'Date', 'Actions'], data.orders.map(o => [o.order_number, o.customer_name, o.seller, `<span class="status status-${o.status}">${o.status}</span>`, new Date(o.created_at).toLocaleDateString(), o.status === 'pending' ? `<button class="btn btn-primary" onclick="updateOrderStatus(${o.id}, 'confirmed')">Confirm</button>` : 'N/A']))}</div>`; } if (currentUser.type === 'seller') { productCatalog = data.products; html += `<div class="card"><div class="card-header"><h3>Product Catalog & Inventory</h3><button class="btn btn-primary" onclick="openSellerOrderModal()">+ New Customer Order</button></div>${renderTable(['Product', 'Model', 'Price', 'Your Stock', 'Distributor Stock', 'Actions'], data.products.map(p => [p.name, p.model, `$${p.price}`, `<strong>${p.seller_stock}</strong>`, p.distributor_stock, `<button class="btn btn-primary" onclick='openSellerStockOrderModal(${JSON.stringify(p)})'>Order Stock</button>`]))}</div>`; html += `<div class="card"><div class="card-header"><h3>Your Customer Orders</h3></div>${renderTable(['Order #', 'Customer', 'Amount', 'Status', 'Date', 'Confirmed By'], data.orders.map(o => [o.order_number, o.customer_name, `$${Number(o.total_amount).toFixed(2)}`, `<span class="status status-${o.status}">${o.status}</span>`, new Date(o.created_at).toLocaleDateString(), o.confirmer_name || '<i>Pending</i>']))}</div>`; } document.getElementById('content-area').innerHTML = html; } catch (err) { document.getElementById('content-area').innerHTML = `<div class="alert alert-danger">Could not load dashboard.</div>`; } }
-        function openModal(html) { document.getElementById('modal-content-host').innerHTML = html; document.getElementById('formModal').style.display = 'block'; }
-        function closeModal() { document.getElementById('formModal').style.display = 'none'; }
-        function openLoginModal(username, roleName) { openModal(`<h2>${roleName} Login</h2><p style="color:var(--text-secondary)">All sample users have the password: <strong>pass</strong></p><div id="login-alert-container"></div><form id="loginForm" onsubmit="event.preventDefault(); performLogin();"><div class="form-group"><label>Username</label><input name="username" value="${username}" required></div><div class="form-group"><label>Password</label><input name="password" type="password" required></div><button type="submit" class="btn btn-primary" style="width:100%;padding:1rem;">Login</button></form>`); document.getElementById('loginForm').password.focus(); }
-        function openNewProductModal() { openModal(`<h2>Create New Product</h2><form id="newProductForm" onsubmit="event.preventDefault(); submitNewProduct();"><div id="product-alert-container"></div><div class="form-grid"><div class="form-group full-width"><label>Product Name</label><input name="name" required></div><div class="form-group"><label>Model</label><input name="model" required></div><div class="form-group"><label>Material</label><input name="material"></div><div class="form-group"><label>Size</label><input name="size"></div><div class="form-group"><label>Color</label><input name="color"></div><div class="form-group"><label>Price (USD)</label><input name="price" type="number" step="0.01" required></div><div class="form-group"><label>Initial Stock Quantity</label><input name="initial_stock" type="number" step="1" required></div></div><button type="submit" class="btn btn-primary" style="width:100%;padding:1rem;margin-top:1rem;">Create Product</button></form>`); }
-        function openMfgUpdateModal(p) { openModal(`<h2>Update Inventory</h2><p>${p.name}</p><div class="form-group"><label>New Quantity</label><input id="mfgQty" type="number" value="${p.quantity}"></div><button class="btn btn-primary" onclick="submitMfgUpdate(${p.product_id})">Update</button>`); }
-        function openDistOrderModal(p) { openModal(`<h2>Order from Manufacturer</h2><p>${p.name}</p><div class="form-group"><label>Quantity</label><input id="distQty" type="number" min="1"></div><button class="btn btn-primary" onclick="submitDistOrder(${p.id})">Order</button>`); }
-        function openSellerStockOrderModal(p) { openModal(`<h2>Order from Distributor</h2><p>${p.name}</p><p>Distributor has: <strong>${p.distributor_stock}</strong> units</p><div class="form-group"><label>Quantity</label><input id="sellerQty" type="number" min="1" max="${p.distributor_stock}"></div><button class="btn btn-primary" onclick="submitSellerStockOrder(${p.id})">Order</button>`); }
-        function openSellerOrderModal() { const list = productCatalog.map(p => `<div style="display:flex;align-items:center;justify-content:space-between;padding:0.5rem;border-bottom:1px solid var(--border-color)"><span><strong>${p.name}</strong><br><small style="color:var(--text-secondary)">Available: ${p.seller_stock + p.distributor_stock}</small></span><input type="number" class="order-item" min="0" data-id="${p.id}" data-price="${p.price}" placeholder="0" style="width:70px"></div>`).join(''); openModal(`<h2>New Customer Order</h2><div class="form-group"><label>Customer Name</label><input id="custName"></div><div class="form-group"><label>Customer Email</label><input id="custEmail"></div><h3 style="margin-top:1.5rem;color:var(--text-secondary)">Items</h3><div style="max-height:200px;overflow-y:auto;border:1px solid var(--border-color);border-radius:8px;padding:0.5rem">${list}</div><button class="btn btn-primary" style="width:100%;padding:1rem;margin-top:1.5rem" onclick="submitSellerOrder()">Create Order</button>`); }
-        async function submitNewProduct() { const form = document.getElementById('newProductForm'); const payload = { name: form.name.value, model: form.model.value, material: form.material.value, size: form.size.value, color: form.color.value, price: form.price.value, initial_stock: form.initial_stock.value }; if (!payload.name || !payload.model || !payload.price || !payload.initial_stock) return showAlert('Please fill out all required fields.', true, 'product-alert-container'); await api('/manufacturer/product', { method: 'POST', body: JSON.stringify(payload) }).then(d => { showAlert(d.message, false); closeModal(); loadDashboard(); }).catch(err => showAlert(err.message, true, 'product-alert-container')); }
-        async function submitMfgUpdate(product_id) { const quantity = parseInt(document.getElementById('mfgQty').value); await api('/manufacturer/inventory', { method: 'PUT', body: JSON.stringify({ product_id, quantity }) }).then(d => { showAlert(d.message, false); closeModal(); loadDashboard(); }).catch(() => {}); }
-        async function submitDistOrder(product_id) { const quantity = parseInt(document.getElementById('distQty').value); if (!quantity || quantity <= 0) return showAlert('Quantity must be greater than 0.', true); await api('/distributor/order', { method: 'POST', body: JSON.stringify({ product_id, quantity }) }).then(d => { showAlert(d.message, false); closeModal(); loadDashboard(); }).catch(() => {}); }
-        async function submitSellerStockOrder(product_id) { const quantity = parseInt(document.getElementById('sellerQty').value); if (!quantity || quantity <= 0) return showAlert('Quantity must be greater than 0.', true); await api('/seller/stock_order', { method: 'POST', body: JSON.stringify({ product_id, quantity }) }).then(d => { showAlert(d.message, false); closeModal(); loadDashboard(); }).catch(() => {}); }
-        async function submitSellerOrder() { const items = Array.from(document.querySelectorAll('.order-item')).map(i => ({ product_id: i.dataset.id, quantity: parseInt(i.value) || 0, price: i.dataset.price })).filter(i => i.quantity > 0); if (items.length === 0) return showAlert('Please add at least one item.', true); const customer_name = document.getElementById('custName').value.trim(); if (!customer_name) return showAlert('Customer name is required.', true); const payload = { customer_name, customer_email: document.getElementById('custEmail').value.trim(), items }; await api('/seller/order', { method: 'POST', body: JSON.stringify(payload) }).then(d => { showAlert(d.message, false); closeModal(); loadDashboard(); }).catch(() => {}); }
-        async function updateOrderStatus(order_id, status) { await api(`/order/${order_id}/status`, { method: 'PUT', body: JSON.stringify({ status }) }).then(d => { showAlert(d.message, false); loadDashboard(); }).catch(() => {}); }
-        window.onclick = (event) => { if (event.target == document.getElementById('formModal')) closeModal(); };
-        document.addEventListener("DOMContentLoaded", async () => { try { const d = await api('/session'); if (d.is_logged_in) { currentUser = d.user; renderUserDisplay(); loadDashboard(); } else { handleLoggedOutState(); } } catch (e) { handleLoggedOutState(); } });
-    </script>
-</body>
-</html>
-"""
+# templates/ is outside Flask's static route; the page has no template variables, so it is read, minified and compressed once here.
+INDEX_PATH = os.path.join(app.root_path, 'templates', 'index.html')
+with open(INDEX_PATH, encoding='utf-8') as index_file: HTML_TEMPLATE = index_file.read()
+
+def minify_html(html):
+    """Minifies the inline CSS and JS and strips comments and indentation from the markup."""
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.S)
+    html = re.sub(r'(<style>)(.*?)(</style>)', lambda m: m[1] + rcssmin.cssmin(m[2]) + m[3], html, flags=re.S)
+    html = re.sub(r'(<script>)(.*?)(</script>)', lambda m: m[1] + rjsmin.jsmin(m[2]) + m[3], html, flags=re.S)
+    return '\n'.join(line.strip() for line in html.splitlines() if line.strip())
+
+INDEX_HTML = minify_html(HTML_TEMPLATE).encode('utf-8')
+INDEX_ETAG = hashlib.sha1(INDEX_HTML).hexdigest()
+INDEX_LAST_MODIFIED = datetime.fromtimestamp(int(os.path.getmtime(INDEX_PATH)), timezone.utc)
+INDEX_ENCODED = {'gzip': gzip.compress(INDEX_HTML, 9)}
+if brotli: INDEX_ENCODED['br'] = brotli.compress(INDEX_HTML, quality=11)
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    # Highest client quality wins, br on a tie; q=0 rules an encoding out.
+    encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in INDEX_ENCODED])
+    response = Response(INDEX_ENCODED[encoding] if encoding else INDEX_HTML, mimetype='text/html')
+    if encoding: response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f"{INDEX_ETAG}-{encoding}" if encoding else INDEX_ETAG)
+    response.last_modified = INDEX_LAST_MODIFIED
+    response.headers['Cache-Control'] = 'public, max-age=300, must-revalidate'
+    return response.make_conditional(request)
 
 if __name__ == '__main__':
     print("🚀 Cozy Comfort Web Server Starting...")